@@ -1,17 +1,37 @@
+import sys
+
 import numpy as np
 
 from loco_mujoco import LocoEnv
 
 
-def experiment(seed=0):
+# environment specific parameters and replay settings
+ENV_CONFIGS = {
+    "HumanoidTorque.walk.real": dict(env_params=dict(use_box_feet=False), create_dataset=True,
+                                     from_velocity=True, n_steps_per_episode=500),
+    "HumanoidTorque4Ages": dict(env_params=dict(), create_dataset=False,
+                                from_velocity=False, n_steps_per_episode=100)
+}
+
+
+def experiment(env_name="HumanoidTorque.walk.real", seed=0):
 
     np.random.seed(seed)
 
-    mdp = LocoEnv.make("HumanoidTorque.walk.real", use_box_feet=False)
-    dataset = mdp.create_dataset()
+    config = ENV_CONFIGS[env_name]
+
+    mdp = LocoEnv.make(env_name, **config["env_params"])
+
+    if config["create_dataset"]:
+        # sanity check, raises an error if the dataset contains terminal states
+        dataset = mdp.create_dataset()
 
-    mdp.play_trajectory_from_velocity(n_steps_per_episode=500)
+    if config["from_velocity"]:
+        mdp.play_trajectory_from_velocity(n_steps_per_episode=config["n_steps_per_episode"])
+    else:
+        mdp.play_trajectory(n_steps_per_episode=config["n_steps_per_episode"])
 
 
 if __name__ == '__main__':
-    experiment()
+    # optionally pass the name of the environment, e.g., "HumanoidTorque4Ages"
+    experiment(*sys.argv[1:2])
@@ -293,14 +293,7 @@ class LocoEnv(MultiMuJoCo):
             if self.trajectories is not None:
                 dataset = self.trajectories.create_dataset(ignore_keys=ignore_keys)
                 # check that all state in the dataset satisfy the has fallen method.
-                for state in dataset["states"]:
-                    has_fallen, msg = self._has_fallen(state, return_err_msg=True)
-                    if has_fallen:
-                        err_msg = "Some of the states in the created dataset are terminal states. " \
-                                  "This should not happen.\n\nViolations:\n"
-                        err_msg += msg
-                        raise ValueError(err_msg)
-
+                self._check_dataset_states(dataset["states"])
             else:
                 raise ValueError("No trajectory was passed to the environment. "
                                  "To create a dataset pass a trajectory first.")
@@ -574,8 +567,8 @@ class LocoEnv(MultiMuJoCo):
                              self.info.observation_space.high[2:])
 
         if self._use_foot_forces:
-            grf_low, grf_high = (-np.ones((self._get_grf_size(),)) * np.inf,
-                                 np.ones((self._get_grf_size(),)) * np.inf)
+            grf_low, grf_high = (np.full(self._get_grf_size(), -np.inf),
+                                 np.full(self._get_grf_size(), np.inf))
             return (np.concatenate([sim_low, grf_low]),
                     np.concatenate([sim_high, grf_high]))
         else:
@@ -596,10 +589,9 @@ class LocoEnv(MultiMuJoCo):
         if self._use_foot_forces:
             obs = np.concatenate([obs[2:],
                                   self.mean_grf.mean / 1000.,
-                                  ]).flatten()
+                                  ])
         else:
-            obs = np.concatenate([obs[2:],
-                                  ]).flatten()
+            obs = obs[2:].copy()
 
         return obs
 
@@ -801,6 +793,41 @@ class LocoEnv(MultiMuJoCo):
         
         raise NotImplementedError
 
+    def _has_fallen_batch(self, states):
+        """
+        Checks for a batch of observations if the model has fallen. By default, _has_fallen is called
+        on each observation, which is not faster than checking the states one by one. Environments can
+        overwrite this function with a vectorized implementation.
+
+        Args:
+            states (np.array): Observations with shape (N_states, dim_state).
+
+        Returns:
+            Boolean np.array with shape (N_states,), which is True for all states in which the model has fallen.
+
+        """
+
+        return np.array([self._has_fallen(state) for state in states], dtype=bool)
+
+    def _check_dataset_states(self, states):
+        """
+        Checks that none of the states of a dataset is a terminal state. A ValueError is raised
+        if the model has fallen in any of the states.
+
+        Args:
+            states (np.array): States of the dataset with shape (N_states, dim_state).
+
+        """
+
+        has_fallen = self._has_fallen_batch(states)
+        if np.any(has_fallen):
+            # only compute the error message for the first violating state
+            _, msg = self._has_fallen(states[np.argmax(has_fallen)], return_err_msg=True)
+            err_msg = "Some of the states in the created dataset are terminal states. " \
+                      "This should not happen.\n\nViolations:\n"
+            err_msg += msg
+            raise ValueError(err_msg)
+
     def _get_interpolate_map_params(self):
         """
         Returns all parameters needed to do the interpolation mapping for the respective environment.
@@ -1,4 +1,5 @@
 import os
+import math
 import warnings
 from pathlib import Path
 from copy import deepcopy
@@ -6,7 +7,6 @@ from copy import deepcopy
 from dm_control import mjcf
 from mushroom_rl.utils.running_stats import *
 from mushroom_rl.utils.mujoco import *
-from mushroom_rl.utils.angles import mat_to_euler, euler_to_mat
 
 import loco_mujoco
 from loco_mujoco.environments import ValidTaskConf
@@ -18,6 +18,16 @@ from loco_mujoco.utils.math import mat2angle_xy, angle2mat_xy, transform_angle_2
 from loco_mujoco.utils.checks import check_validity_task_mode_dataset
 
 
+# paths to the xml files (either for torque or position control)
+_DATA_DIR = Path(__file__).resolve().parent.parent / "data" / "quadrupeds"
+_XML_PATH_TORQUE = (_DATA_DIR / "unitree_a1_torque.xml").as_posix()
+_XML_PATH_POSITION = (_DATA_DIR / "unitree_a1_position.xml").as_posix()
+
+# limits of the trunk list and tilt angles, and the trunk height, used to check if the robot has fallen
+_TRUNK_EULER_LIMITS = np.array([0.2793, 0.192])
+_TRUNK_HEIGHT_LIMIT = -0.24
+
+
 class UnitreeA1(LocoEnv):
 
     """
@@ -209,11 +219,9 @@ class UnitreeA1(LocoEnv):
 
         # Choose xml file (either for torque or position control)
         if action_mode == "torque":
-            xml_path = (Path(__file__).resolve().parent.parent / "data" / "quadrupeds" /
-                        "unitree_a1_torque.xml").as_posix()
+            xml_path = _XML_PATH_TORQUE
         else:
-            xml_path = (Path(__file__).resolve().parent.parent / "data" / "quadrupeds" /
-                        "unitree_a1_position.xml").as_posix()
+            xml_path = _XML_PATH_POSITION
 
         self._action_mode = action_mode
         action_spec = self._get_action_specification()
@@ -242,6 +250,16 @@ class UnitreeA1(LocoEnv):
         super().__init__(xml_handle, action_spec, observation_spec,  collision_groups,
                          camera_params=camera_params, **kwargs)
 
+        # cache the indices needed at each step and reset
+        self._rot_mat_idx_arrow = self._get_idx("dir_arrow")
+        keys = self.obs_helper.get_all_observation_keys()
+        self._relevant_idx_rotation = (keys.index("q_trunk_rotation"),
+                                       keys.index("dq_trunk_tx"),
+                                       keys.index("dq_trunk_ty"))
+        self._trunk_euler_idx = [self.get_obs_idx("q_trunk_list")[0], self.get_obs_idx("q_trunk_tilt")[0]]
+        self._trunk_height_idx = self.get_obs_idx("q_trunk_tz")[0]
+        self._set_arrow_handles()
+
     def setup(self, obs):
         """
         Function to setup the initial state of the simulation. Initialization can be done either
@@ -254,6 +272,9 @@ class UnitreeA1(LocoEnv):
 
         self._reward_function.reset_state()
 
+        # the data might have changed (e.g., multiple models or domain randomization)
+        self._set_arrow_handles()
+
         if obs is not None:
             self._init_sim_from_obs(obs)
         else:
@@ -269,7 +290,7 @@ class UnitreeA1(LocoEnv):
                     sample = self.trajectories.reset_trajectory()
                     if self.setup_random_rot:
                         angle = np.random.uniform(0, 2 * np.pi)
-                        sample = rotate_obs(sample, angle,  *self._get_relevant_idx_rotation())
+                        sample = self._rotate_sample(sample, angle)
                 elif self._init_step_no:
                     traj_len = self.trajectories.trajectory_length
                     n_traj = self.trajectories.nnumber_of_trajectories
@@ -282,7 +303,7 @@ class UnitreeA1(LocoEnv):
                     sample = self.trajectories.reset_trajectory(substep_no=0)
                     if self.setup_random_rot:
                         angle = np.random.uniform(0, 2 * np.pi)
-                        sample = rotate_obs(sample, angle,  *self._get_relevant_idx_rotation())
+                        sample = self._rotate_sample(sample, angle)
 
                 # set the goal
                 rot_mat = self.trajectories.get_from_sample(sample, "dir_arrow")
@@ -293,6 +314,29 @@ class UnitreeA1(LocoEnv):
                 # set the state of the simulation
                 self.set_sim_state(sample)
 
+    def _rotate_sample(self, sample, angle):
+        """
+        Rotates a trajectory sample around the rotation axis.
+
+        Args:
+            sample (list): Trajectory sample as list of np.arrays, one for each key.
+            angle (float): Angle of rotation in radians.
+
+        Returns:
+            List of np.arrays constituting the rotated sample.
+
+        """
+
+        # the entries of the sample differ in size (e.g., dir_arrow), hence only the relevant entries are rotated
+        idx = self._get_relevant_idx_rotation()
+        rotated_entries = rotate_obs(np.concatenate([sample[i] for i in idx]), angle, 0, 1, 2)
+
+        sample = list(sample)
+        for i, entry in zip(idx, rotated_entries):
+            sample[i] = np.array([entry])
+
+        return sample
+
     def set_sim_state(self, sample):
         """
         Sets the state of the simulation according to an observation.
@@ -326,12 +370,11 @@ class UnitreeA1(LocoEnv):
                 ignore_keys = ["q_trunk_tx", "q_trunk_ty"]
 
             if self.trajectories is not None:
-                rot_mat_idx_arrow = self._get_idx("dir_arrow")
-                state_callback_params = dict(rot_mat_idx_arrow=rot_mat_idx_arrow,
-                                             goal_velocity_idx=self._goal_velocity_idx)
-                dataset = self.trajectories.create_dataset(ignore_keys=ignore_keys,
-                                                           state_callback=self._modify_observation_callback,
-                                                           state_callback_params=state_callback_params)
+                dataset = self.trajectories.create_dataset(ignore_keys=ignore_keys)
+                # transform all states at once instead of using a per-state callback
+                for key in ["states", "next_states"]:
+                    dataset[key] = self._modify_observation_callback_batch(dataset[key], self._rot_mat_idx_arrow,
+                                                                           self._goal_velocity_idx)
             else:
                 raise ValueError("No trajectory was passed to the environment. "
                                  "To create a dataset pass a trajectory first.")
@@ -425,21 +468,38 @@ class UnitreeA1(LocoEnv):
         dir_arrow_idx = self._get_idx("dir_arrow")
         sim_low, sim_high = (self.info.observation_space.low[2:],
                              self.info.observation_space.high[2:])
-        sin_cos_angle_low = [-1, -1]
-        sin_cos_angle_high = [1, 1]
-        goal_vel_low = -np.inf
-        goal_vel_high = np.inf
-        sim_low = np.concatenate([sim_low[:dir_arrow_idx[0]], sin_cos_angle_low, [goal_vel_low]])
-        sim_high = np.concatenate([sim_high[:dir_arrow_idx[0]], sin_cos_angle_high, [goal_vel_high]])
+        # bounds of the sin-cos feature of the goal direction and the goal velocity
+        goal_low = np.array([-1.0, -1.0, -np.inf])
+        goal_high = np.array([1.0, 1.0, np.inf])
+        sim_low = np.concatenate([sim_low[:dir_arrow_idx[0]], goal_low])
+        sim_high = np.concatenate([sim_high[:dir_arrow_idx[0]], goal_high])
 
         if self._use_foot_forces:
-            grf_low, grf_high = (-np.ones((12,)) * np.inf,
-                                 np.ones((12,)) * np.inf)
+            grf_low, grf_high = (np.full(self._get_grf_size(), -np.inf),
+                                 np.full(self._get_grf_size(), np.inf))
             return (np.concatenate([sim_low, grf_low]),
                     np.concatenate([sim_high, grf_high]))
         else:
             return sim_low, sim_high
 
+    def render(self, record=False):
+        """
+        Renders the environment. The ball of the goal arrow is not updated while there is no viewer,
+        hence it is updated once before the viewer is created to avoid a stale first frame.
+
+        Args:
+            record (bool): If True, the rendered frame is recorded.
+
+        Returns:
+            The rendered frame.
+
+        """
+
+        if self._viewer is None:
+            self._set_goal_arrow_ball()
+
+        return super().render(record)
+
     def _simulation_post_step(self):
         """
         Sets the correct rotation of the goal arrow and the calculates the
@@ -462,18 +522,26 @@ class UnitreeA1(LocoEnv):
             New observation vector (np.array);
 
         """
-        rot_mat_idx_arrow = self._get_idx("dir_arrow")
+        rot_mat_start = self._rot_mat_idx_arrow[0]
+
+        # fill the new observation in place instead of concatenating the parts. Note: The running
+        # observation is kept by the environment, hence a new array has to be created at each call.
+        new_obs = np.empty(self.info.observation_space.shape)
 
-        obs = np.concatenate([obs[2:], [self._goal.get_velocity()]]).flatten()
+        # remove x and y, and transform the rotation matrix of the arrow to a sin-cos feature
+        new_obs[:rot_mat_start] = obs[2:rot_mat_start + 2]
+        new_obs[rot_mat_start:rot_mat_start + 2] = self._rot_mat_to_sin_cos(obs[rot_mat_start + 2:])
 
-        obs = self._modify_observation_callback(obs, rot_mat_idx_arrow, self._goal_velocity_idx)
+        # trajectory samples (e.g., during replay) already include the goal velocity, use the goal otherwise
+        if len(obs) > self._goal_velocity_idx + 2:
+            new_obs[rot_mat_start + 2:rot_mat_start + 3] = obs[self._goal_velocity_idx + 2]
+        else:
+            new_obs[rot_mat_start + 2:rot_mat_start + 3] = self._goal.get_velocity()
 
         if self._use_foot_forces:
-            obs = np.concatenate([obs,
-                                  self.mean_grf.mean / 1000.,
-                                  ]).flatten()
+            np.divide(self.mean_grf.mean, 1000., out=new_obs[rot_mat_start + 3:])
 
-        return obs
+        return new_obs
 
     def _get_reward_function(self, reward_type, reward_params):
         """
@@ -514,13 +582,12 @@ class UnitreeA1(LocoEnv):
 
         """
 
-        trunk_euler = self._get_from_obs(obs, ["q_trunk_list", "q_trunk_tilt"])
-        trunk_height = self._get_from_obs(obs, ["q_trunk_tz"])
+        trunk_euler = obs[self._trunk_euler_idx]
+        trunk_height = obs[self._trunk_height_idx]
 
-        trunk_list_condition = (trunk_euler[0] < -0.2793) or (trunk_euler[0] > 0.2793)
-        trunk_tilt_condition = (trunk_euler[1] < -0.192) or (trunk_euler[1] > 0.192)
-        trunk_height_condition = trunk_height[0] < -.24
-        trunk_condition = (trunk_list_condition or trunk_tilt_condition or trunk_height_condition)
+        trunk_list_condition, trunk_tilt_condition = np.abs(trunk_euler) > _TRUNK_EULER_LIMITS
+        trunk_height_condition = trunk_height < _TRUNK_HEIGHT_LIMIT
+        trunk_condition = bool(trunk_list_condition | trunk_tilt_condition | trunk_height_condition)
 
         if return_err_msg:
             error_msg = ""
@@ -542,11 +609,7 @@ class UnitreeA1(LocoEnv):
 
         """
 
-        keys = self.obs_helper.get_all_observation_keys()
-        idx_rot = keys.index("q_trunk_rotation")
-        idx_xvel = keys.index("dq_trunk_tx")
-        idx_yvel = keys.index("dq_trunk_ty")
-        return idx_rot, idx_xvel, idx_yvel
+        return self._relevant_idx_rotation
 
     def _get_ground_forces(self):
         """
@@ -564,20 +627,47 @@ class UnitreeA1(LocoEnv):
     def _set_goal_arrow(self):
         """
         Sets the rotation of the goal arrow based on the current trunk
-        rotation angle and the current goal direction.
+        rotation angle and the current goal direction. Note: The rotation of
+        the arrow is part of the observation and is therefore always set.
 
         """
 
         desired_angle = self._goal.get_direction()
+        cos_angle, sin_angle = math.cos(desired_angle), math.sin(desired_angle)
 
-        rot_mat = euler_to_mat(np.array([np.pi/2, 0, desired_angle]))
+        # set the rotation of the cylinder. This is the flattened rotation matrix of the
+        # euler angles [pi/2, 0, desired_angle], written directly to the site.
+        arrow_xmat = self._arrow_site.xmat
+        arrow_xmat[:] = (cos_angle, 0.0, sin_angle,
+                         sin_angle, 0.0, -cos_angle,
+                         0.0, 1.0, 0.0)
 
-        # and set the rotation of the cylinder
-        self._data.site("dir_arrow").xmat = (rot_mat).reshape((9,))
+        # the ball is only used for visualization, hence skip it if nothing is rendered.
+        if self._viewer is not None:
+            self._set_goal_arrow_ball()
 
-        # calc position of the ball corresponding to the arrow
-        self._data.site("dir_arrow_ball").xpos = self._data.body("dir_arrow").xpos + \
-                                                 [-0.1 * np.sin(desired_angle), 0.1 * np.cos(desired_angle), 0]
+    def _set_goal_arrow_ball(self):
+        """
+        Sets the position of the ball corresponding to the goal arrow based on the current goal direction.
+
+        """
+
+        desired_angle = self._goal.get_direction()
+        arrow_xpos = self._arrow_body.xpos
+        ball_xpos = self._arrow_ball_site.xpos
+        ball_xpos[0] = arrow_xpos[0] - 0.1 * math.sin(desired_angle)
+        ball_xpos[1] = arrow_xpos[1] + 0.1 * math.cos(desired_angle)
+        ball_xpos[2] = arrow_xpos[2]
+
+    def _set_arrow_handles(self):
+        """
+        Gets the handles of the goal arrow from the current data.
+
+        """
+
+        self._arrow_site = self._data.site("dir_arrow")
+        self._arrow_ball_site = self._data.site("dir_arrow_ball")
+        self._arrow_body = self._data.body("dir_arrow")
 
     def _init_sim_from_obs(self, obs):
         """
@@ -714,43 +804,83 @@ class UnitreeA1(LocoEnv):
         """
         The goal speed is not in the observation helper, but only in the trajectory. This is a workaround
         to access it anyways.
-        Note: This is the goal velocity in index *before* the modify_observation_callback is applied!
+        Note: This is the goal velocity in index *before* the _modify_observation_callback_batch is applied!
 
         """
         return 43
 
     @staticmethod
-    def _modify_observation_callback(obs, rot_mat_idx_arrow, goal_velocity_idx):
+    def _modify_observation_callback_batch(states, rot_mat_idx_arrow, goal_velocity_idx):
+        """
+        Transforms the rotation matrix of a batch of states to a sin-cos feature.
+
+        Args:
+            states (np.array): Generated states with shape (N_states, dim_state).
+            rot_mat_idx_arrow (np.array): Indices of the rotation matrix in the states.
+            goal_velocity_idx (int): Index of the goal speed in the states.
+
+        Returns:
+            The final environment observations for the agent with shape (N_states, dim_observation).
+
+        """
+
+        rot_mat_start = rot_mat_idx_arrow[0]
+        new_states = np.empty((len(states), rot_mat_start + 3))
+        new_states[:, :rot_mat_start] = states[:, :rot_mat_start]
+
+        # make sin-cos transformation of the rotation matrices
+        new_states[:, rot_mat_start], new_states[:, rot_mat_start + 1] = \
+            UnitreeA1._rot_mat_to_sin_cos_batch(states[:, rot_mat_idx_arrow])
+
+        # get goal velocities
+        new_states[:, rot_mat_start + 2] = states[:, goal_velocity_idx]
+
+        return new_states
+
+    @staticmethod
+    def _rot_mat_to_sin_cos(rot_mat):
         """
-        Transforms the rotation matrix from obs to a sin-cos feature.
+        Transforms the flattened rotation matrix of the goal arrow to a sin-cos feature of the goal direction.
+        This is called at each step, hence the scalar math functions are used.
 
         Args:
-            obs (np.array): Generated observation.
-            rot_mat_idx_arrow (int): Index of the beginning rotation matrix in the observation.
-            goal_velocity_idx (int): Index of the goal speed in the observation.
+            rot_mat (np.array): Flattened rotation matrix with shape (9,). Only the first 4 entries are used.
 
         Returns:
-            The final environment observation for the agent.
+            Tuple of the cosine and the sine of the goal direction.
 
         """
 
-        rot_mat_arrow = obs[rot_mat_idx_arrow].reshape((3, 3))
-        # convert mat to angle
-        angle = mat2angle_xy(rot_mat_arrow)
+        # convert mat to angle (uses the entries (1, 0) and (0, 0) of the rotation matrix)
+        angle = math.atan2(rot_mat[3], rot_mat[0])
         # transform the angle to be in [-pi, pi]
         angle = transform_angle_2pi(angle)
         # rotate by 90 degrees
-        angle -= np.pi / 2
-        # make sin-cos transformation
-        angle = np.array([np.cos(angle), np.sin(angle)])
+        angle -= math.pi / 2
+
+        return math.cos(angle), math.sin(angle)
 
-        # get goal velocity
-        goal_velocity = obs[goal_velocity_idx]
+    @staticmethod
+    def _rot_mat_to_sin_cos_batch(rot_mats):
+        """
+        Vectorized version of _rot_mat_to_sin_cos for a batch of flattened rotation matrices.
 
-        # concatenate everything to new obs
-        new_obs = np.concatenate([obs[:rot_mat_idx_arrow[0]], angle, [goal_velocity]])
+        Args:
+            rot_mats (np.array): Flattened rotation matrices with shape (N, 9).
 
-        return new_obs
+        Returns:
+            Tuple of np.arrays with shape (N,) containing the cosine and the sine of the goal directions.
+
+        """
+
+        # convert mat to angle (uses the entries (1, 0) and (0, 0) of the rotation matrix)
+        angles = np.arctan2(rot_mats[:, 3], rot_mats[:, 0])
+        # transform the angles to be in [-pi, pi]
+        angles = transform_angle_2pi(angles)
+        # rotate by 90 degrees
+        angles -= np.pi / 2
+
+        return np.cos(angles), np.sin(angles)
 
     @staticmethod
     def _add_dir_vector_to_xml_handle(xml_handle):
@@ -873,17 +1003,18 @@ class UnitreeA1(LocoEnv):
 
         rot_mat_idx = interpolate_map_params["rot_mat_idx"]
         trunk_orientation_idx = interpolate_map_params["trunk_orientation_idx"]
-        traj_list = [list() for j in range(len(traj))]
-        for i in range(len(traj_list)):
-            # if the state is a rotation
-            if i in trunk_orientation_idx:  # todo: not sure if this is actually needed.
-                # change it to the nearest rotation presentation to the previous state
-                # -> no huge jumps between -pi and pi for example
-                traj_list[i] = list(np.unwrap(traj[i]))
-            else:
-                traj_list[i] = list(traj[i])
-        # turn matrices into angles todo: this is slow, implement vectorized implementation
-        traj_list[rot_mat_idx] = np.array([mat2angle_xy(mat) for mat in traj[rot_mat_idx]])
+        traj_list = list(traj)
+
+        # change the rotations to the nearest rotation presentation to the previous state
+        # -> no huge jumps between -pi and pi for example todo: not sure if this is actually needed.
+        trunk_orientations = np.unwrap(np.stack([traj[i] for i in trunk_orientation_idx]), axis=-1)
+        for i, trunk_orientation in zip(trunk_orientation_idx, trunk_orientations):
+            traj_list[i] = trunk_orientation
+
+        # turn matrices into angles in the x-y-plane
+        rot_mats = np.asarray(traj[rot_mat_idx]).reshape((-1, 3, 3))
+        traj_list[rot_mat_idx] = np.arctan2(rot_mats[:, 1, 0], rot_mats[:, 0, 0])
+
         return np.array(traj_list)
 
     @staticmethod
@@ -913,7 +1044,7 @@ class UnitreeA1(LocoEnv):
             # if the state is a rotation
             if i in trunk_orientation_idx:
                 # make sure it is in range -pi,pi
-                traj_list[i] = [transform_angle_2pi(angle) for angle in traj[i]]
+                traj_list[i] = transform_angle_2pi(np.asarray(traj[i]))
             elif i in velocity_indices:
                 # the interpolation is problematic in the joint velocities for the Unitree. Recalculate them here based
                 # on the positions
@@ -923,6 +1054,11 @@ class UnitreeA1(LocoEnv):
             else:
                 traj_list[i] = list(traj[i])
 
-        # transforms angles into rotation matrices todo: this is slow, implement vectorized implementation
-        traj_list[angle_idx] = np.array([angle2mat_xy(angle).reshape(9,) for angle in traj[angle_idx]])
+        # transforms angles into (flattened) rotation matrices around the z-axis
+        angles = np.asarray(traj[angle_idx])
+        cos_angles, sin_angles = np.cos(angles), np.sin(angles)
+        zeros, ones = np.zeros_like(angles), np.ones_like(angles)
+        traj_list[angle_idx] = np.stack([cos_angles, -sin_angles, zeros,
+                                         sin_angles, cos_angles, zeros,
+                                         zeros, zeros, ones], axis=-1)
         return traj_list
@@ -21,15 +21,38 @@ def rotate_obs(state, angle, idx_rot, idx_xvel, idx_yvel):
     state = np.array(state)
     rotated_state = state.copy()
 
+    cos_angle, sin_angle = np.cos(angle), np.sin(angle)
+
     # add rotation to trunk rotation and transform to range [-pi, pi]
     rotated_state[idx_rot] = (state[idx_rot] + angle + np.pi) % (2 * np.pi) - np.pi
     # rotate x,y velocity
-    rotated_state[idx_xvel] = np.cos(angle) * state[idx_xvel] - np.sin(angle) * state[idx_yvel]
-    rotated_state[idx_yvel] = np.sin(angle) * state[idx_xvel] + np.cos(angle) * state[idx_yvel]
+    rotated_state[idx_xvel] = cos_angle * state[idx_xvel] - sin_angle * state[idx_yvel]
+    rotated_state[idx_yvel] = sin_angle * state[idx_xvel] + cos_angle * state[idx_yvel]
 
     return rotated_state
 
 
+def rotate_obs_batch(states, angle, idx_rot, idx_xvel, idx_yvel):
+    """
+    Function to rotate a batch of states around the rotation axis. Contrary to rotate_obs, the
+    states are expected to be stored row-wise.
+
+    Args:
+        states (list or np.array): States to be rotated with shape (N_states, dim_state).
+        angle (float or np.array): Angle of rotation in radians. Can also be an np.array of
+            shape (N_states,) containing one angle per state.
+        idx_rot (int): Index of rotation angle entry in the state.
+        idx_xvel (int): Index of x-velocity entry in the state.
+        idx_yvel (int): Index of y-velocity entry in the state.
+
+    Returns:
+        np.array of rotated states with shape (N_states, dim_state).
+
+    """
+
+    return rotate_obs(np.asarray(states).T, angle, idx_rot, idx_xvel, idx_yvel).T
+
+
 def mat2angle_xy(mat):
     """
     Converts a rotation matrix to an angle in the x-y-plane.
@@ -66,10 +89,10 @@ def angle2mat_xy(angle):
 
 def transform_angle_2pi(angle):
     """
-    Transforms an angle to be in [-pi, pi].
+    Transforms an angle (or an array of angles) to be in [-pi, pi].
 
     Args:
-        angle (float): Angle in radians.
+        angle (float or np.array): Angle in radians.
 
     Returns:
         Angle in radians in [-pi, pi].
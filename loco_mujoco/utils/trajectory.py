@@ -391,7 +391,8 @@ class Trajectory:
 
         """
 
-        return [np.array(obs[i].copy()).flatten() for obs in self.subtraj]
+        # np.array already copies the sample, reshape returns a view on that copy
+        return [np.array(obs[i]).reshape(-1) for obs in self.subtraj]
 
     @property
     def number_obs_trajectory(self):
@@ -0,0 +1,73 @@
+import numpy as np
+
+from loco_mujoco.utils.math import rotate_obs, rotate_obs_batch
+
+
+N_STATES = 50
+DIM_STATE = 6
+IDX_ROT, IDX_XVEL, IDX_YVEL = 1, 3, 4
+
+
+def rotate_obs_reference(state, angle):
+    """ Rotates a single state entry by entry. """
+    rotated_state = np.array(state, dtype=float)
+    rotated_state[IDX_ROT] = np.arctan2(np.sin(state[IDX_ROT] + angle), np.cos(state[IDX_ROT] + angle))
+    rotated_state[IDX_XVEL] = np.cos(angle) * state[IDX_XVEL] - np.sin(angle) * state[IDX_YVEL]
+    rotated_state[IDX_YVEL] = np.sin(angle) * state[IDX_XVEL] + np.cos(angle) * state[IDX_YVEL]
+    return rotated_state
+
+
+def test_rotate_obs():
+    np.random.seed(0)
+
+    state = np.random.randn(DIM_STATE)
+    angle = np.random.uniform(0, 2 * np.pi)
+
+    state_copy = state.copy()
+
+    rotated_state = rotate_obs(state, angle, IDX_ROT, IDX_XVEL, IDX_YVEL)
+
+    assert rotated_state.shape == (DIM_STATE,)
+    assert np.allclose(rotated_state, rotate_obs_reference(state, angle))
+    # the input is not modified
+    assert np.array_equal(state, state_copy)
+
+
+def test_rotate_obs_key_major():
+    np.random.seed(1)
+
+    # states stored per key, as in the trajectory data
+    states = np.random.randn(DIM_STATE, N_STATES)
+    angle = np.random.uniform(0, 2 * np.pi)
+
+    rotated_states = rotate_obs(states, angle, IDX_ROT, IDX_XVEL, IDX_YVEL)
+
+    expected = np.array([rotate_obs_reference(s, angle) for s in states.T]).T
+    assert rotated_states.shape == (DIM_STATE, N_STATES)
+    assert np.allclose(rotated_states, expected)
+
+
+def test_rotate_obs_batch():
+    np.random.seed(2)
+
+    states = np.random.randn(N_STATES, DIM_STATE)
+    angle = np.random.uniform(0, 2 * np.pi)
+
+    rotated_states = rotate_obs_batch(states, angle, IDX_ROT, IDX_XVEL, IDX_YVEL)
+
+    expected = np.array([rotate_obs_reference(s, angle) for s in states])
+    assert rotated_states.shape == (N_STATES, DIM_STATE)
+    assert np.allclose(rotated_states, expected)
+
+
+def test_rotate_obs_batch_per_state_angle():
+    np.random.seed(3)
+
+    states = np.random.randn(N_STATES, DIM_STATE)
+    angles = np.random.uniform(0, 2 * np.pi, N_STATES)
+
+    rotated_states = rotate_obs_batch(states, angles, IDX_ROT, IDX_XVEL, IDX_YVEL)
+
+    expected = np.array([rotate_obs_reference(s, a) for s, a in zip(states, angles)])
+    assert rotated_states.shape == (N_STATES, DIM_STATE)
+    assert np.allclose(rotated_states, expected)
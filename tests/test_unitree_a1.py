@@ -0,0 +1,169 @@
+import numpy as np
+from mushroom_rl.utils.angles import euler_to_mat
+
+from loco_mujoco import LocoEnv
+from loco_mujoco.environments.quadrupeds import UnitreeA1
+from loco_mujoco.utils.math import mat2angle_xy, angle2mat_xy, transform_angle_2pi
+
+
+N_STATES = 100
+ROT_MAT_IDX_ARROW = np.arange(34, 43)
+GOAL_VELOCITY_IDX = 43
+N_SAMPLES = 200
+
+
+def arrow_rot_mat(angle):
+    """ Flattened rotation matrix of the goal arrow, as set in UnitreeA1._set_goal_arrow. """
+    return euler_to_mat(np.array([np.pi / 2, 0, angle])).reshape((9,))
+
+
+def test_modify_observation_callback_batch():
+    np.random.seed(0)
+
+    states = np.random.randn(N_STATES, GOAL_VELOCITY_IDX + 1)
+    states[:, ROT_MAT_IDX_ARROW] = [arrow_rot_mat(a) for a in np.random.uniform(-2 * np.pi, 2 * np.pi, N_STATES)]
+
+    # per-state transformation used before the batched version
+    expected = []
+    for state in states:
+        angle = transform_angle_2pi(mat2angle_xy(state[ROT_MAT_IDX_ARROW].reshape((3, 3)))) - np.pi / 2
+        expected.append(np.concatenate([state[:ROT_MAT_IDX_ARROW[0]], [np.cos(angle), np.sin(angle)],
+                                        [state[GOAL_VELOCITY_IDX]]]))
+
+    new_states = UnitreeA1._modify_observation_callback_batch(states, ROT_MAT_IDX_ARROW, GOAL_VELOCITY_IDX)
+
+    assert new_states.shape == (N_STATES, ROT_MAT_IDX_ARROW[0] + 3)
+    assert np.allclose(new_states, np.array(expected))
+
+
+def test_rot_mat_to_sin_cos():
+    np.random.seed(0)
+
+    rot_mats = np.array([arrow_rot_mat(a) for a in np.random.uniform(-2 * np.pi, 2 * np.pi, N_STATES)])
+
+    cos_batch, sin_batch = UnitreeA1._rot_mat_to_sin_cos_batch(rot_mats)
+
+    for rot_mat, cos_angle, sin_angle in zip(rot_mats, cos_batch, sin_batch):
+        assert np.allclose(UnitreeA1._rot_mat_to_sin_cos(rot_mat), (cos_angle, sin_angle))
+
+
+def test_has_fallen():
+    np.random.seed(0)
+
+    mdp = LocoEnv.make("UnitreeA1.simple", debug=True)
+
+    states = mdp.create_dataset()["states"][:N_STATES]
+
+    list_idx, tilt_idx = mdp._trunk_euler_idx
+    height_idx = mdp._trunk_height_idx
+    list_limit, tilt_limit, height_limit = 0.2793, 0.192, -0.24
+
+    # states exactly at, slightly above and slightly below the limits
+    limit_states = []
+    for idx, limit in [(list_idx, list_limit), (list_idx, -list_limit), (tilt_idx, tilt_limit),
+                       (tilt_idx, -tilt_limit), (height_idx, height_limit)]:
+        for offset in [0.0, 1e-6, -1e-6]:
+            state = states[0].copy()
+            state[idx] = limit + offset
+            limit_states.append(state)
+
+    # states containing NaNs
+    nan_states = []
+    for idx in [list_idx, tilt_idx, height_idx]:
+        state = states[0].copy()
+        state[idx] = np.nan
+        nan_states.append(state)
+    nan_states.append(np.full_like(states[0], np.nan))
+
+    # random states, of which some have fallen
+    random_states = np.tile(states[0], (N_STATES, 1))
+    random_states[:, [list_idx, tilt_idx]] = np.random.uniform(-0.4, 0.4, (N_STATES, 2))
+    random_states[:, height_idx] = np.random.uniform(-0.3, 0.0, N_STATES)
+
+    all_states = np.concatenate([states, limit_states, nan_states, random_states])
+
+    # scalar comparisons used before the vectorized version
+    expected = np.array([(s[list_idx] < -list_limit) or (s[list_idx] > list_limit) or
+                         (s[tilt_idx] < -tilt_limit) or (s[tilt_idx] > tilt_limit) or
+                         (s[height_idx] < height_limit) for s in all_states])
+    has_fallen = np.array([mdp._has_fallen(state) for state in all_states])
+
+    assert np.array_equal(has_fallen, expected)
+    assert not np.any(has_fallen[:len(states)])
+    assert np.any(has_fallen[len(states):])
+
+
+def test_interpolate_map():
+    np.random.seed(0)
+
+    # trajectory of a scalar observation, the three trunk orientations and the direction arrow
+    trunk_orientation_idx = [1, 2, 3]
+    rot_mat_idx = 4
+    traj = [np.random.randn(N_SAMPLES) for _ in range(rot_mat_idx)]
+    for i in trunk_orientation_idx:
+        traj[i] = np.cumsum(np.random.uniform(-0.5, 0.5, N_SAMPLES)) % (2 * np.pi) - np.pi
+    traj.append(np.array([angle2mat_xy(a).reshape((9,)) for a in np.random.uniform(-np.pi, np.pi, N_SAMPLES)]))
+
+    # per-sample mapping used before the vectorized version
+    expected = [np.unwrap(t) if i in trunk_orientation_idx else t for i, t in enumerate(traj)]
+    expected[rot_mat_idx] = np.array([mat2angle_xy(mat) for mat in traj[rot_mat_idx]])
+
+    mapped_traj = UnitreeA1._interpolate_map(traj, rot_mat_idx=rot_mat_idx,
+                                             trunk_orientation_idx=trunk_orientation_idx)
+
+    assert mapped_traj.shape == (len(traj), N_SAMPLES)
+    assert np.allclose(mapped_traj, np.array(expected))
+
+
+def test_interpolate_remap():
+    np.random.seed(1)
+
+    # trajectory of four positions (three of them trunk orientations), the direction angle and four velocities
+    trunk_orientation_idx = [1, 2, 3]
+    angle_idx = 4
+    position_indices = [0, 1, 2, 3]
+    velocity_indices = [5, 6, 7, 8]
+    ctrl_dt = 0.01
+    traj = np.random.uniform(-2 * np.pi, 2 * np.pi, (9, N_SAMPLES))
+
+    # per-sample remapping used before the vectorized version
+    expected = [list(t) for t in traj]
+    for i in trunk_orientation_idx:
+        expected[i] = [transform_angle_2pi(angle) for angle in traj[i]]
+    for i, j in zip(velocity_indices, position_indices):
+        expected[i] = [0.0] + list((traj[j][1:] - traj[j][:-1]) / ctrl_dt)
+    expected[angle_idx] = np.array([angle2mat_xy(angle).reshape((9,)) for angle in traj[angle_idx]])
+
+    remapped_traj = UnitreeA1._interpolate_remap(traj, angle_idx=angle_idx,
+                                                 trunk_orientation_idx=trunk_orientation_idx,
+                                                 position_indices=position_indices,
+                                                 velocity_indices=velocity_indices, ctrl_dt=ctrl_dt)
+
+    assert len(remapped_traj) == len(traj)
+    assert np.shape(remapped_traj[angle_idx]) == (N_SAMPLES, 9)
+    for remapped_obs, expected_obs in zip(remapped_traj, expected):
+        assert np.allclose(remapped_obs, expected_obs)
+
+
+def test_setup_random_rot():
+    np.random.seed(0)
+
+    mdp = LocoEnv.make("UnitreeA1.simple", debug=True, setup_random_rot=True)
+    rot_idx, x_vel_idx, y_vel_idx = mdp._get_relevant_idx_rotation()
+
+    for _ in range(5):
+        obs = mdp.reset()
+
+        assert obs.shape == mdp.info.observation_space.shape
+        assert np.all(np.isfinite(obs))
+
+    # only the trunk rotation and the x-y velocities are rotated
+    sample = mdp.trajectories.reset_trajectory(substep_no=0, traj_no=0)
+    rotated_sample = mdp._rotate_sample(sample, np.pi / 2)
+    for i, (entry, rotated_entry) in enumerate(zip(sample, rotated_sample)):
+        assert rotated_entry.shape == entry.shape
+        if i not in (rot_idx, x_vel_idx, y_vel_idx):
+            assert np.array_equal(rotated_entry, entry)
+    assert np.allclose(rotated_sample[rot_idx], transform_angle_2pi(sample[rot_idx] + np.pi / 2))
+    assert np.allclose(rotated_sample[x_vel_idx], -sample[y_vel_idx])
+    assert np.allclose(rotated_sample[y_vel_idx], sample[x_vel_idx])